@@ -106,7 +106,7 @@ def initialize_bkt_states(db: Session, user_id: int) -> Dict[str, float]:
         else:
             skill_levels[skill_name] = existing.p_learned
     
-    db.commit()
+    db.flush()  # Caller owns the transaction
     return skill_levels
 
 
@@ -133,7 +133,7 @@ def update_bkt(db: Session, user_id: int, scenario_type: str, correct: bool) ->
         scenario_type: Type of emergency scenario
         correct: Whether the response was correct
     
-    Returns: Updated skill levels dictionary
+    Returns: Updated skill levels dictionary (session mutated only; the caller commits)
     """
     skills_exercised = SCENARIO_SKILL_MAP.get(scenario_type, ["sound_action_mapping"])
     updated_skills = {}
@@ -192,26 +192,32 @@ def update_bkt(db: Session, user_id: int, scenario_type: str, correct: bool) ->
         
         updated_skills[skill_name] = round(p_l_new, 4)
     
-    db.commit()
     return updated_skills
 
 
-def get_skill_levels(db: Session, user_id: int) -> Dict[str, Dict]:
+def get_skill_levels(db: Session, user_id: int,
+                     states: Optional[List[models.BKTSkillState]] = None) -> Dict[str, Dict]:
     """
     Get current BKT skill levels for a user.
     
+    Args:
+        states: Optional already-loaded states (e.g. User.bkt_states); skips the query
+    
     Returns: Dictionary with skill details including:
         - p_learned: Current mastery probability
         - mastery_achieved: Boolean
         - total_attempts: Practice count
         - mastery_label: Human-readable label
     """
-    states = db.query(models.BKTSkillState).filter(
-        models.BKTSkillState.user_id == user_id
-    ).all()
+    if states is None:
+        states = db.query(models.BKTSkillState).filter(
+            models.BKTSkillState.user_id == user_id
+        ).all()
     
     if not states:
-        return initialize_bkt_states(db, user_id)
+        skill_levels = initialize_bkt_states(db, user_id)
+        db.commit()
+        return skill_levels
     
     result = {}
     for state in states:
@@ -277,11 +283,15 @@ def get_skill_based_scenario(db: Session, user_id: int) -> Optional[str]:
     return None
 
 
-def calculate_overall_mastery(db: Session, user_id: int) -> float:
+def calculate_overall_mastery(db: Session, user_id: int,
+                              states: Optional[List[models.BKTSkillState]] = None) -> float:
     """
     Calculate weighted average mastery across all skills.
     Weights reflect clinical importance for hearing-impaired children.
     
+    Args:
+        states: Optional already-loaded states (e.g. User.bkt_states); skips the query
+    
     Returns: Overall mastery score (0-1)
     """
     SKILL_WEIGHTS = {
@@ -292,9 +302,10 @@ def calculate_overall_mastery(db: Session, user_id: int) -> float:
         "auditory_attention": 0.15
     }
     
-    states = db.query(models.BKTSkillState).filter(
-        models.BKTSkillState.user_id == user_id
-    ).all()
+    if not states:
+        states = db.query(models.BKTSkillState).filter(
+            models.BKTSkillState.user_id == user_id
+        ).all()
     
     if not states:
         return 0.0
@@ -0,0 +1,51 @@
+"""
+Analytics Cache Module
+======================
+In-process caches for analytics results that are expensive to compute but
+only change when the user's underlying data changes.
+
+Entries are tagged with a data version (see crud.get_data_version); a lookup
+only hits when the stored version matches the caller's current one, so new
+attempts or sessions invalidate the entry without explicit eviction.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+import time
+from typing import Any, Hashable, Optional
+
+
+class VersionedCache:
+    """
+    Thread-safe LRU mapping key -> (version, value).
+    
+    An optional ttl (seconds) additionally expires entries whose value also
+    depends on wall-clock time (e.g. "last N days" windows).
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Hashable, version: Hashable) -> Optional[Any]:
+        """Return the cached value if it was stored for this version, else None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            if entry[2] is not None and entry[2] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: Hashable, version: Hashable, value: Any) -> None:
+        """Store value for key at version, evicting the least recently used entry."""
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (version, value, expires_at)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
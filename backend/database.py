@@ -10,7 +10,7 @@ Recommended free PostgreSQL providers for production:
   - Aiven (aiven.io) — free PostgreSQL tier
 """
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -26,6 +26,28 @@ SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./hero_dash.db")
 if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
     SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
+class _VarPop:
+    """
+    VAR_POP aggregate for SQLite (PostgreSQL has it built in).
+    Single-pass Welford update; NULLs are ignored like the SQL standard.
+    """
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+    
+    def step(self, value):
+        if value is None:
+            return
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += (value - self.mean) * delta
+    
+    def finalize(self):
+        return self.m2 / self.n if self.n else None
+
+
 # Configure engine with appropriate settings
 if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
     # SQLite-specific configuration (local development only)
@@ -33,18 +55,35 @@ if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
         SQLALCHEMY_DATABASE_URL,
         connect_args={"check_same_thread": False}
     )
+    
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """WAL journal + relaxed fsync: far cheaper commits, still crash-safe"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")  # 256 MB
+        cursor.execute("PRAGMA cache_size=-65536")    # 64 MB
+        cursor.close()
+        dbapi_connection.create_aggregate("var_pop", 1, _VarPop)
 else:
     # PostgreSQL with connection pooling for production
+    # Sized for the FastAPI worker threadpool; lower these on providers with
+    # tight connection limits
     engine = create_engine(
         SQLALCHEMY_DATABASE_URL,
-        pool_size=5,
-        max_overflow=10,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "40")),
         pool_timeout=30,
         pool_recycle=1800,  # Recycle connections every 30 min
         pool_pre_ping=True,  # Verify connections before use
+        pool_use_lifo=True,  # Reuse the most recent (warm) connection first
     )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: committed objects keep their loaded/flushed values, so
+# returning them after commit does not trigger a reload SELECT
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 Base = declarative_base()
 
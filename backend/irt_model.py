@@ -206,7 +206,9 @@ def estimate_ability_from_db(db: Session, user_id: int) -> Dict:
     Returns:
         Dict with theta, se, ability_label, percentile_estimate
     """
-    attempts = db.query(models.Attempt).filter(
+    attempts = db.query(
+        models.Attempt.scenario_type, models.Attempt.noise_level, models.Attempt.success
+    ).filter(
         models.Attempt.user_id == user_id
     ).order_by(models.Attempt.timestamp.desc()).limit(100).all()
     
@@ -261,7 +263,10 @@ def get_ability_growth_trajectory(db: Session, user_id: int, window_size: int =
     
     Returns: List of {attempt_number, theta, se, timestamp}
     """
-    attempts = db.query(models.Attempt).filter(
+    attempts = db.query(
+        models.Attempt.scenario_type, models.Attempt.noise_level,
+        models.Attempt.success, models.Attempt.timestamp
+    ).filter(
         models.Attempt.user_id == user_id
     ).order_by(models.Attempt.timestamp.asc()).all()
     
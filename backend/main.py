@@ -5,21 +5,25 @@ FastAPI backend for auditory therapy game.
 Provides ML-powered scenario recommendations, user management, and analytics.
 """
 
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from contextlib import asynccontextmanager
+import anyio
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import and_, case, func, insert, select
 from typing import Optional, List
+from bisect import bisect_right
 from datetime import datetime, timedelta
 import random
 import os
 from dotenv import load_dotenv
 import models, schemas, crud, database, ml_algorithms
 import bayesian_knowledge_tracing as bkt
+from cache import VersionedCache
 import irt_model as irt
 import psychometrics
 import numpy as np
-import json
+import copy
 
 # Load environment variables from .env file
 load_dotenv()
@@ -58,7 +62,17 @@ try:
 finally:
     _seed_db.close()
 
-app = FastAPI()
+# Sync endpoints run in AnyIO's worker threadpool (40 threads by default).
+# Match it to the DB connection pool (pool_size + max_overflow) so requests
+# queue on the database rather than on a thread shortage.
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "60"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    yield
+
+app = FastAPI(lifespan=lifespan)
 
 # Get allowed origins from environment variable or use defaults
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "http://localhost:5173,http://localhost:3000").split(",")
@@ -103,12 +117,18 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     return crud.create_user(db=db, user=user)
 
 @app.post("/attempts/", response_model=schemas.Attempt)
-def record_attempt(attempt: schemas.AttemptCreate, db: Session = Depends(get_db)):
+def record_attempt(attempt: schemas.AttemptCreate, background_tasks: BackgroundTasks,
+                   db: Session = Depends(get_db)):
     """
     Record a game attempt with ML processing.
-    Updates user stats, Thompson Sampling, and Spaced Repetition models.
+    The attempt and user stats are saved before responding; Thompson Sampling,
+    Spaced Repetition, BKT and profile updates, then the clinical score
+    refresh, run as background tasks.
     """
-    return crud.create_attempt(db=db, attempt=attempt)
+    db_attempt = crud.persist_attempt(db=db, attempt=attempt)
+    background_tasks.add_task(crud.apply_ml_updates, attempt)
+    background_tasks.add_task(crud.refresh_clinical_scores, attempt.user_id)
+    return db_attempt
 
 @app.get("/recommend/{user_id}", response_model=schemas.ScenarioRecommendation)
 def get_recommendation(user_id: int, db: Session = Depends(get_db)):
@@ -143,7 +163,9 @@ def get_clinical_scores(user_id: int, db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    scores = ml_algorithms.calculate_clinical_scores(db, user_id)
+    # Saved to the database unless already done for this data version
+    # (usually by the background refresh after the last attempt)
+    scores = crud.persist_clinical_scores(db, user_id)
     
     if not scores:
         return {
@@ -154,18 +176,6 @@ def get_clinical_scores(user_id: int, db: Session = Depends(get_db)):
             ).count()
         }
     
-    # Save to database
-    assessment = models.ClinicalAssessment(
-        user_id=user_id,
-        figure_ground_discrimination_score=scores["figure_ground_score"],
-        temporal_processing_score=scores["temporal_processing_score"],
-        sound_localization_score=scores["sound_localization_score"],
-        auditory_attention_span=scores["auditory_attention_span"],
-        composite_score=scores["composite_score"]
-    )
-    db.add(assessment)
-    db.commit()
-    
     return {
         "user_id": user_id,
         "username": user.username,
@@ -175,25 +185,37 @@ def get_clinical_scores(user_id: int, db: Session = Depends(get_db)):
     }
 
 
+# Composite score bands (lower bounds) -> (performance level, clinical note)
+CLINICAL_LEVEL_THRESHOLDS = (50, 65, 80)
+CLINICAL_LEVELS = (
+    ("Needs Support", "Recommend professional audiological evaluation"),
+    ("Developing", "Some areas need targeted intervention"),
+    ("Good", "Performance within or above typical range"),
+    ("Excellent", "Performance well above age-expected norms"),
+)
+
+# (score key, minimum score, strength label)
+STRENGTH_AREAS = (
+    ("figure_ground_score", 70, "Figure-ground discrimination"),
+    ("temporal_processing_score", 70, "Temporal processing"),
+    ("sound_localization_score", 70, "Sound identification"),
+)
+
+# (score key, score below which practice is needed, improvement label)
+IMPROVEMENT_AREAS = (
+    ("figure_ground_score", 60, "Noise filtering ability"),
+    ("temporal_processing_score", 60, "Processing speed consistency"),
+    ("sound_localization_score", 60, "Sound recognition accuracy"),
+    ("auditory_attention_span", 180, "Sustained attention"),
+)
+
+
 def interpret_clinical_scores(scores: dict) -> dict:
     """
     Provide clinical interpretation of composite scores.
     Classifies performance and identifies strengths/weaknesses.
     """
-    composite = scores["composite_score"]
-    
-    if composite >= 80:
-        level = "Excellent"
-        note = "Performance well above age-expected norms"
-    elif composite >= 65:
-        level = "Good"
-        note = "Performance within or above typical range"
-    elif composite >= 50:
-        level = "Developing"
-        note = "Some areas need targeted intervention"
-    else:
-        level = "Needs Support"
-        note = "Recommend professional audiological evaluation"
+    level, note = CLINICAL_LEVELS[bisect_right(CLINICAL_LEVEL_THRESHOLDS, scores["composite_score"])]
     
     return {
         "performance_level": level,
@@ -205,30 +227,22 @@ def interpret_clinical_scores(scores: dict) -> dict:
 
 def get_strength_areas(scores: dict) -> list:
     """Identify performance areas where user excels (score >= 70)"""
-    strengths = []
-    if scores["figure_ground_score"] >= 70:
-        strengths.append("Figure-ground discrimination")
-    if scores["temporal_processing_score"] >= 70:
-        strengths.append("Temporal processing")
-    if scores["sound_localization_score"] >= 70:
-        strengths.append("Sound identification")
+    strengths = [label for key, minimum, label in STRENGTH_AREAS if scores[key] >= minimum]
     return strengths if strengths else ["Building foundation"]
 
 
 def get_improvement_areas(scores: dict) -> list:
     """Identify areas needing targeted practice (score < 60)"""
-    improvements = []
-    if scores["figure_ground_score"] < 60:
-        improvements.append("Noise filtering ability")
-    if scores["temporal_processing_score"] < 60:
-        improvements.append("Processing speed consistency")
-    if scores["sound_localization_score"] < 60:
-        improvements.append("Sound recognition accuracy")
-    if scores["auditory_attention_span"] < 180:
-        improvements.append("Sustained attention")
+    improvements = [label for key, below, label in IMPROVEMENT_AREAS if scores[key] < below]
     return improvements if improvements else ["Continue current program"]
 
 
+# Report bodies per (user_id, days). The data version invalidates entries on
+# new attempts/sessions; the TTL bounds drift of the time-based parts
+# (report window, cognitive-load window) while nothing new is recorded.
+PROGRESS_REPORT_CACHE = VersionedCache(maxsize=1024, ttl=60)
+
+
 @app.get("/analytics/progress-report/{user_id}")
 def generate_progress_report(user_id: int, days: Optional[int] = 30, db: Session = Depends(get_db)):
     """
@@ -244,58 +258,69 @@ def generate_progress_report(user_id: int, days: Optional[int] = 30, db: Session
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Fetch attempts from specified time period
+    version = crud.get_data_version(db, user_id)
+    cached = PROGRESS_REPORT_CACHE.get((user_id, days), version)
+    if cached is not None:
+        return cached
+    
+    # Per-scenario totals for the period in one GROUP BY pass
     cutoff_date = datetime.utcnow() - timedelta(days=days)
-    all_attempts = db.query(models.Attempt).filter(
+    in_period = and_(
         models.Attempt.user_id == user_id,
         models.Attempt.timestamp >= cutoff_date
-    ).order_by(models.Attempt.timestamp).all()
-    
-    if not all_attempts:
+    )
+    valid_rt = models.Attempt.reaction_time > 0
+    scenario_rows = db.execute(select(
+        models.Attempt.scenario_type,
+        func.count(),
+        func.sum(case((models.Attempt.success, 1), else_=0)),
+        func.sum(case((valid_rt, models.Attempt.reaction_time), else_=0.0)),
+        func.count(case((valid_rt, 1)))
+    ).where(in_period).group_by(
+        models.Attempt.scenario_type
+    ).order_by(func.min(models.Attempt.timestamp))).all()
+    
+    if not scenario_rows:
         return {"error": "No data in specified time period"}
     
-    # Calculate overall metrics
-    total_attempts = len(all_attempts)
-    success_rate = sum(1 for a in all_attempts if a.success) / total_attempts
+    # Calculate overall metrics from the per-scenario sums
+    total_attempts = sum(row[1] for row in scenario_rows)
+    success_rate = sum(row[2] for row in scenario_rows) / total_attempts
     
-    reaction_times = [a.reaction_time for a in all_attempts if a.reaction_time > 0]
-    avg_rt = np.mean(reaction_times) if reaction_times else 0
+    rt_sum = sum(row[3] for row in scenario_rows)
+    rt_count = sum(row[4] for row in scenario_rows)
+    avg_rt = rt_sum / rt_count if rt_count else 0
     
     # Calculate improvement rate (first 25% vs last 25%)
+    # Each quarter is a LIMIT-bound subquery averaged in the database
     quarter_size = max(1, total_attempts // 4)
-    first_quarter = all_attempts[:quarter_size]
-    last_quarter = all_attempts[-quarter_size:]
     
-    first_success = sum(1 for a in first_quarter if a.success) / len(first_quarter)
-    last_success = sum(1 for a in last_quarter if a.success) / len(last_quarter)
+    def quarter_success(order):
+        quarter = select(
+            case((models.Attempt.success, 1.0), else_=0.0).label("hit")
+        ).where(in_period).order_by(order).limit(quarter_size).subquery()
+        return float(db.execute(select(func.avg(quarter.c.hit))).scalar())
+    
+    first_success = quarter_success(models.Attempt.timestamp)
+    last_success = quarter_success(models.Attempt.timestamp.desc())
     improvement = last_success - first_success
     
     # Scenario breakdown
-    from collections import defaultdict
-    scenario_stats = defaultdict(lambda: {"total": 0, "success": 0, "avg_rt": []})
-    
-    for attempt in all_attempts:
-        scenario_stats[attempt.scenario_type]["total"] += 1
-        if attempt.success:
-            scenario_stats[attempt.scenario_type]["success"] += 1
-        if attempt.reaction_time > 0:
-            scenario_stats[attempt.scenario_type]["avg_rt"].append(attempt.reaction_time)
-    
     scenario_summary = {}
-    for scenario, stats in scenario_stats.items():
+    for scenario, total, succeeded, scenario_rt_sum, scenario_rt_count in scenario_rows:
         scenario_summary[scenario] = {
-            "attempts": int(stats["total"]),
-            "success_rate": float(round(stats["success"] / stats["total"] * 100, 1)),
-            "avg_reaction_time": float(round(np.mean(stats["avg_rt"]), 2)) if stats["avg_rt"] else 0.0
+            "attempts": int(total),
+            "success_rate": float(round(succeeded / total * 100, 1)),
+            "avg_reaction_time": float(round(scenario_rt_sum / scenario_rt_count, 2)) if scenario_rt_count else 0.0
         }
     
     # Get clinical recommendations
-    recommendations = ml_algorithms.generate_clinical_recommendations(db, user_id)
+    recommendations = crud.get_clinical_recommendations(db, user_id, version)
     
     # Get flow state analysis
     flow_state = ml_algorithms.detect_flow_state(db, user_id)
     
-    return {
+    report = {
         "report_period": f"Last {days} days",
         "generated_at": datetime.utcnow().isoformat(),
         "user_info": {
@@ -319,6 +344,8 @@ def generate_progress_report(user_id: int, days: Optional[int] = 30, db: Session
         "clinical_recommendations": recommendations,
         "next_steps": generate_next_steps(scenario_summary, flow_state, recommendations)
     }
+    PROGRESS_REPORT_CACHE.put((user_id, days), version, report)
+    return report
 
 
 def generate_next_steps(scenario_summary: dict, flow_state: dict, recommendations: list) -> list:
@@ -352,33 +379,42 @@ def get_learning_curve_data(user_id: int, db: Session = Depends(get_db)):
     Get data for learning curve visualization
     Returns moving average of success rate over time
     """
-    attempts = db.query(models.Attempt).filter(
+    # Only the plotted columns, as plain tuples (no ORM instance hydration)
+    attempts = db.execute(select(
+        models.Attempt.success,
+        models.Attempt.timestamp,
+        models.Attempt.difficulty_level,
+        models.Attempt.scenario_type
+    ).where(
         models.Attempt.user_id == user_id
-    ).order_by(models.Attempt.timestamp).all()
+    ).order_by(models.Attempt.timestamp)).all()
     
     if not attempts:
         return {"data_points": []}
     
-    # Calculate moving average (window = 10)
+    # Calculate moving average (window = 10) from a prefix sum of successes
     window_size = 10
-    data_points = []
-    
-    for i in range(len(attempts)):
-        start = max(0, i - window_size + 1)
-        window = attempts[start:i+1]
-        avg_success = sum(1 for a in window if a.success) / len(window)
-        
-        data_points.append({
+    n = len(attempts)
+    succ = np.fromiter((a.success for a in attempts), dtype=np.int8, count=n)
+    csum = np.concatenate(([0], np.cumsum(succ, dtype=np.int32)))
+    idx = np.arange(n)
+    start = np.maximum(0, idx - window_size + 1)
+    moving_avg = np.round((csum[idx + 1] - csum[start]) / (idx + 1 - start), 3).tolist()
+    
+    data_points = [
+        {
             "attempt_number": i + 1,
-            "success": attempts[i].success,
-            "moving_average": round(avg_success, 3),
-            "timestamp": attempts[i].timestamp.isoformat(),
-            "difficulty": attempts[i].difficulty_level,
-            "scenario": attempts[i].scenario_type
-        })
+            "success": a.success,
+            "moving_average": moving_avg[i],
+            "timestamp": a.timestamp.isoformat(),
+            "difficulty": a.difficulty_level,
+            "scenario": a.scenario_type
+        }
+        for i, a in enumerate(attempts)
+    ]
     
     return {
-        "total_attempts": len(attempts),
+        "total_attempts": n,
         "data_points": data_points
     }
 
@@ -389,7 +425,7 @@ def get_cognitive_load_status(user_id: int, db: Session = Depends(get_db)):
     Get real-time cognitive load assessment
     """
     cognitive_load = ml_algorithms.calculate_cognitive_load(db, user_id, window_minutes=10)
-    flow_state = ml_algorithms.detect_flow_state(db, user_id)
+    flow_state = ml_algorithms.detect_flow_state(db, user_id, cognitive_load=cognitive_load)
     
     return {
         "cognitive_load": round(cognitive_load, 2),
@@ -399,14 +435,13 @@ def get_cognitive_load_status(user_id: int, db: Session = Depends(get_db)):
     }
 
 
+LOAD_LEVEL_THRESHOLDS = (0.3, 0.6)
+LOAD_LEVELS = ("Low", "Moderate", "High")
+
+
 def get_load_level(cognitive_load: float) -> str:
     """Categorize cognitive load"""
-    if cognitive_load < 0.3:
-        return "Low"
-    elif cognitive_load < 0.6:
-        return "Moderate"
-    else:
-        return "High"
+    return LOAD_LEVELS[bisect_right(LOAD_LEVEL_THRESHOLDS, cognitive_load)]
 
 
 def get_cognitive_recommendation(cognitive_load: float, flow_state: dict) -> str:
@@ -432,25 +467,29 @@ def start_session(user_id: int, db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    session = models.SessionMetrics(
-        user_id=user_id,
-        session_start=datetime.utcnow()
-    )
-    db.add(session)
+    # INSERT ... RETURNING: one statement, no follow-up refresh SELECT
+    session_id, session_start = db.execute(
+        insert(models.SessionMetrics).values(
+            user_id=user_id,
+            session_start=datetime.utcnow()
+        ).returning(models.SessionMetrics.id, models.SessionMetrics.session_start)
+    ).one()
     db.commit()
-    db.refresh(session)
     
     return {
-        "session_id": session.id,
-        "started_at": session.session_start.isoformat(),
+        "session_id": session_id,
+        "started_at": session_start.isoformat(),
         "message": "Session tracking started"
     }
 
 
 @app.post("/analytics/end-session/{session_id}")
-def end_session(session_id: int, db: Session = Depends(get_db)):
+def end_session(session_id: int, background_tasks: BackgroundTasks,
+                db: Session = Depends(get_db)):
     """
-    End a training session and calculate metrics
+    End a training session and calculate metrics.
+    Ending a session changes the attention span, so the clinical scores are
+    refreshed as a background task.
     """
     session = db.query(models.SessionMetrics).filter(
         models.SessionMetrics.id == session_id
@@ -461,26 +500,36 @@ def end_session(session_id: int, db: Session = Depends(get_db)):
     
     session.session_end = datetime.utcnow()
     
-    # Calculate session metrics
-    attempts = db.query(models.Attempt).filter(
+    # Calculate session metrics in one aggregate pass over the session window
+    in_session = and_(
         models.Attempt.user_id == session.user_id,
         models.Attempt.timestamp >= session.session_start,
         models.Attempt.timestamp <= session.session_end
-    ).all()
-    
-    if attempts:
-        initial_perf = sum(1 for a in attempts[:5] if a.success) / min(5, len(attempts))
-        final_perf = sum(1 for a in attempts[-5:] if a.success) / min(5, len(attempts))
+    )
+    attempt_count, rt_variance = db.query(
+        func.count(),
+        func.var_pop(case((models.Attempt.reaction_time > 0, models.Attempt.reaction_time)))
+    ).filter(in_session).one()
+    
+    if attempt_count:
+        # Only the first/last 5 success flags are needed for the trajectory
+        first_five = db.query(models.Attempt.success).filter(in_session).order_by(
+            models.Attempt.timestamp).limit(5).all()
+        last_five = db.query(models.Attempt.success).filter(in_session).order_by(
+            models.Attempt.timestamp.desc()).limit(5).all()
+        
+        initial_perf = sum(a.success for a in first_five) / len(first_five)
+        final_perf = sum(a.success for a in last_five) / len(last_five)
         
         session.initial_performance = initial_perf
         session.final_performance = final_perf
         session.learning_velocity = final_perf - initial_perf
         
-        reaction_times = [a.reaction_time for a in attempts if a.reaction_time > 0]
-        if reaction_times:
-            session.response_consistency = float(1 / (1 + np.var(reaction_times)))
+        if rt_variance is not None:
+            session.response_consistency = float(1 / (1 + rt_variance))
     
     db.commit()
+    background_tasks.add_task(crud.refresh_clinical_scores, session.user_id)
     
     duration_seconds = (session.session_end - session.session_start).total_seconds()
     
@@ -488,7 +537,7 @@ def end_session(session_id: int, db: Session = Depends(get_db)):
         "session_id": session.id,
         "duration_seconds": round(duration_seconds, 1),
         "duration_minutes": round(duration_seconds / 60, 1),
-        "attempts_made": len(attempts),
+        "attempts_made": attempt_count,
         "learning_velocity": round(session.learning_velocity, 3),
         "message": "Session completed"
     }
@@ -512,12 +561,14 @@ def get_bkt_skill_levels(user_id: int, db: Session = Depends(get_db)):
     
     Based on: Corbett & Anderson (1994) Hidden Markov Model
     """
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = db.query(models.User).options(
+        selectinload(models.User.bkt_states)
+    ).filter(models.User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    skill_levels = bkt.get_skill_levels(db, user_id)
-    overall_mastery = bkt.calculate_overall_mastery(db, user_id)
+    skill_levels = bkt.get_skill_levels(db, user_id, user.bkt_states)
+    overall_mastery = bkt.calculate_overall_mastery(db, user_id, user.bkt_states)
     
     return {
         "user_id": user_id,
@@ -624,7 +675,7 @@ def get_age_normalized_scores(user_id: int, db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    raw_scores = ml_algorithms.calculate_clinical_scores(db, user_id)
+    raw_scores = crud.get_clinical_scores(db, user_id)
     if not raw_scores:
         return {
             "error": "Insufficient data",
@@ -684,20 +735,12 @@ def start_assessment(user_id: int, assessment_type: str = "baseline",
     db.refresh(assessment)
     
     # Generate randomized trial sequence (4 of each type)
-    scenarios = ["tsunami_siren", "earthquake_alarm", "flood_warning", "air_raid_siren", "building_fire_alarm"] * 4
+    scenarios = list(crud.ALL_TYPES) * 4
     random.shuffle(scenarios)
     
-    scenario_map = {
-        "tsunami_siren": {"action": "Move Right", "visual_cue": "Tsunami Warning Lights"},
-        "earthquake_alarm": {"action": "Stop", "visual_cue": "Seismic Warning Lights"},
-        "flood_warning": {"action": "Find Safe Place", "visual_cue": "Flood Warning Lights"},
-        "air_raid_siren": {"action": "Stay Center", "visual_cue": "Civil Defense Lights"},
-        "building_fire_alarm": {"action": "Move Left", "visual_cue": "Building Fire Alarm Lights"},
-    }
-    
     trials = []
     for i, scenario in enumerate(scenarios):
-        details = scenario_map[scenario]
+        details = crud.SCENARIO_MAP[scenario]
         trials.append({
             "trial_number": i + 1,
             "scenario_type": scenario,
@@ -718,10 +761,11 @@ def start_assessment(user_id: int, assessment_type: str = "baseline",
 
 @app.post("/assessment/record-trial/{assessment_id}")
 def record_assessment_trial(assessment_id: int, trial: schemas.AssessmentTrialResult,
-                            db: Session = Depends(get_db)):
+                            background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """
     Record a single assessment trial result.
-    Updates assessment progress and stores the attempt.
+    Updates assessment progress and stores the attempt; the clinical score
+    refresh runs as a background task.
     """
     assessment = db.query(models.AssessmentSession).filter(
         models.AssessmentSession.id == assessment_id
@@ -746,7 +790,7 @@ def record_assessment_trial(assessment_id: int, trial: schemas.AssessmentTrialRe
     assessment.trials_completed += 1
     
     # Update per-scenario results
-    results = json.loads(assessment.scenario_results or "{}")
+    results = copy.deepcopy(assessment.scenario_results or {})
     if trial.scenario_type not in results:
         results[trial.scenario_type] = {"correct": 0, "total": 0, "reaction_times": []}
     
@@ -755,8 +799,9 @@ def record_assessment_trial(assessment_id: int, trial: schemas.AssessmentTrialRe
         results[trial.scenario_type]["correct"] += 1
     results[trial.scenario_type]["reaction_times"].append(trial.reaction_time)
     
-    assessment.scenario_results = json.dumps(results)
+    assessment.scenario_results = results
     db.commit()
+    background_tasks.add_task(crud.refresh_clinical_scores, trial.user_id)
     
     return {
         "trial_recorded": trial.trial_number,
@@ -780,7 +825,7 @@ def complete_assessment(assessment_id: int, db: Session = Depends(get_db)):
     
     assessment.completed_at = datetime.utcnow()
     
-    results = json.loads(assessment.scenario_results or "{}")
+    results = copy.deepcopy(assessment.scenario_results or {})
     
     # Calculate overall metrics
     total_correct = sum(r.get("correct", 0) for r in results.values())
@@ -799,7 +844,7 @@ def complete_assessment(assessment_id: int, db: Session = Depends(get_db)):
     
     assessment.overall_accuracy = (total_correct / total_trials * 100) if total_trials > 0 else 0
     assessment.avg_reaction_time = (sum(all_rts) / len(all_rts)) if all_rts else 0
-    assessment.scenario_results = json.dumps(results)
+    assessment.scenario_results = results
     
     # If post-test, calculate effect size vs baseline
     comparison = None
@@ -1005,14 +1050,16 @@ def get_therapist_dashboard(user_id: int, db: Session = Depends(get_db)):
     
     Based on: Moeller (2000); DesJardin & Eisenberg (2024)
     """
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    # Related rows arrive in batched IN (...) selects with the user
+    user = db.query(models.User).options(
+        selectinload(models.User.session_metrics),
+        selectinload(models.User.bkt_states)
+    ).filter(models.User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Total sessions and training time
-    sessions = db.query(models.SessionMetrics).filter(
-        models.SessionMetrics.user_id == user_id
-    ).all()
+    sessions = user.session_metrics
     
     total_sessions = len(sessions)
     total_minutes = sum(
@@ -1032,14 +1079,15 @@ def get_therapist_dashboard(user_id: int, db: Session = Depends(get_db)):
     overall_accuracy = (successful / total_attempts * 100) if total_attempts > 0 else 0
     
     # BKT skills
-    skill_levels = bkt.get_skill_levels(db, user_id)
-    overall_mastery = bkt.calculate_overall_mastery(db, user_id)
+    skill_levels = bkt.get_skill_levels(db, user_id, user.bkt_states)
+    overall_mastery = bkt.calculate_overall_mastery(db, user_id, user.bkt_states)
     
     # IRT ability
     ability = irt.estimate_ability_from_db(db, user_id)
     
     # Clinical scores (age-normalized)
-    raw_scores = ml_algorithms.calculate_clinical_scores(db, user_id)
+    version = crud.get_data_version(db, user_id)
+    raw_scores = crud.get_clinical_scores(db, user_id, version)
     normalized = None
     if raw_scores:
         normalized = psychometrics.calculate_age_normalized_scores(
@@ -1050,7 +1098,7 @@ def get_therapist_dashboard(user_id: int, db: Session = Depends(get_db)):
     psych_report = psychometrics.generate_psychometric_report(db, user_id)
     
     # Clinical recommendations
-    recommendations = ml_algorithms.generate_clinical_recommendations(db, user_id)
+    recommendations = crud.get_clinical_recommendations(db, user_id, version)
     
     # SOAP-style clinical note
     soap_note = generate_soap_note(user, overall_accuracy, skill_levels, ability, recommendations)
@@ -1195,31 +1243,36 @@ def export_clinical_report(user_id: int, days: int = 30,
         
         # Compute per-scenario data from attempts
         cutoff_date = datetime.utcnow() - timedelta(days=days)
-        period_attempts = db.query(models.Attempt).filter(
+        period_attempts = db.query(
+            models.Attempt.scenario_type,
+            models.Attempt.success,
+            models.Attempt.reaction_time
+        ).filter(
             models.Attempt.user_id == user_id,
             models.Attempt.timestamp >= cutoff_date
         ).all()
         
+        # Running sums per scenario: [attempts, successes, rt_sum, rt_count]
         per_scenario = {}
-        all_rts = []
-        for a in period_attempts:
-            sc = a.scenario_type
-            if sc not in per_scenario:
-                per_scenario[sc] = {"attempts": 0, "successes": 0, "rts": []}
-            per_scenario[sc]["attempts"] += 1
-            if a.success:
-                per_scenario[sc]["successes"] += 1
-            if a.reaction_time and a.reaction_time > 0:
-                per_scenario[sc]["rts"].append(a.reaction_time)
-                all_rts.append(a.reaction_time)
+        for sc, success, rt in period_attempts:
+            stats = per_scenario.get(sc)
+            if stats is None:
+                stats = per_scenario[sc] = [0, 0, 0.0, 0]
+            stats[0] += 1
+            stats[1] += success
+            if rt and rt > 0:
+                stats[2] += rt
+                stats[3] += 1
         
         per_scenario_clean = {}
-        for sc, d in per_scenario.items():
+        for sc, (attempts, successes, rt_sum, rt_count) in per_scenario.items():
             per_scenario_clean[sc] = {
-                "attempts": d["attempts"],
-                "successes": d["successes"],
-                "avg_rt": round(float(np.mean(d["rts"])), 2) if d["rts"] else None,
+                "attempts": attempts,
+                "successes": successes,
+                "avg_rt": round(rt_sum / rt_count, 2) if rt_count else None,
             }
+        all_rt_sum = sum(stats[2] for stats in per_scenario.values())
+        all_rt_count = sum(stats[3] for stats in per_scenario.values())
         
         total_attempts = dash_summary.get("total_attempts", 0)
         total_sessions = dash_summary.get("total_sessions", 0)
@@ -1229,7 +1282,7 @@ def export_clinical_report(user_id: int, days: int = 30,
             "total_sessions": total_sessions,
             "total_attempts": total_attempts,
             "success_rate": round(overall_accuracy / 100, 3) if overall_accuracy else 0,
-            "avg_reaction_time": round(float(np.mean(all_rts)), 2) if all_rts else None,
+            "avg_reaction_time": round(all_rt_sum / all_rt_count, 2) if all_rt_count else None,
             "per_scenario": per_scenario_clean if per_scenario_clean else None,
         }
         
@@ -1290,11 +1343,12 @@ def get_memory_states(user_id: int, db: Session = Depends(get_db)):
         models.SkillMemoryState.user_id == user_id
     ).all()
     
+    now = datetime.utcnow()
+    strengths = ml_algorithms.memory_strengths(skills, now).tolist()
     memory_states = []
-    for skill in skills:
-        current_strength = ml_algorithms.calculate_memory_decay(db, user_id, skill.scenario_type)
-        time_since_practice = (datetime.utcnow() - skill.last_practiced).total_seconds() / 3600  # hours
-        is_due = skill.next_review_date <= datetime.utcnow()
+    for skill, current_strength in zip(skills, strengths):
+        time_since_practice = (now - skill.last_practiced).total_seconds() / 3600  # hours
+        is_due = skill.next_review_date <= now
         
         memory_states.append({
             "scenario_type": skill.scenario_type,
@@ -1335,11 +1389,10 @@ def get_due_reviews(user_id: int, db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    due_scenarios = ml_algorithms.get_due_for_review(db, user_id)
+    due_scenarios = ml_algorithms.get_due_review_strengths(db, user_id)
     
     due_details = []
-    for scenario in due_scenarios:
-        strength = ml_algorithms.calculate_memory_decay(db, user_id, scenario)
+    for scenario, strength in due_scenarios:
         due_details.append({
             "scenario_type": scenario,
             "current_memory_strength": round(strength, 4),
@@ -1377,14 +1430,17 @@ def get_training_plan(user_id: int, db: Session = Depends(get_db)):
     - Roediger & Butler (2011): Retrieval practice
     - Bjork & Bjork (2020): Desirable difficulties
     """
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = db.query(models.User).options(
+        selectinload(models.User.bkt_states),
+        selectinload(models.User.skill_memories)
+    ).filter(models.User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Gather data for plan generation
-    skill_levels = bkt.get_skill_levels(db, user_id)
-    due_reviews = ml_algorithms.get_due_for_review(db, user_id)
-    attention_span = ml_algorithms.calculate_attention_span(db, user_id)
+    skill_levels = bkt.get_skill_levels(db, user_id, user.bkt_states)
+    due_reviews = ml_algorithms.get_due_for_review(db, user_id, user.skill_memories)
+    attention_span = crud.get_attention_span(db, user_id)
     cognitive_load = ml_algorithms.calculate_cognitive_load(db, user_id, window_minutes=60)
     
     # Total attempts for training maturity
@@ -1564,23 +1620,27 @@ def get_achievements(user_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="User not found")
     
     # Gather all metrics
-    all_attempts = db.query(models.Attempt).filter(
-        models.Attempt.user_id == user_id
-    ).order_by(models.Attempt.timestamp).all()
+    all_attempts = db.execute(
+        select(
+            models.Attempt.success,
+            models.Attempt.reaction_time,
+            models.Attempt.scenario_type,
+            models.Attempt.timestamp
+        ).where(models.Attempt.user_id == user_id)
+        .order_by(models.Attempt.timestamp)
+    ).all()
     
     total_attempts = len(all_attempts)
-    successful = sum(1 for a in all_attempts if a.success)
+    success = np.fromiter((a.success for a in all_attempts), dtype=bool, count=total_attempts)
+    reaction_times = np.array([a.reaction_time for a in all_attempts], dtype=np.float64)
+    successful = int(np.count_nonzero(success))
     accuracy = (successful / total_attempts * 100) if total_attempts > 0 else 0
     
-    # Calculate max streak
-    max_streak = 0
-    current_streak = 0
-    for a in all_attempts:
-        if a.success:
-            current_streak += 1
-            max_streak = max(max_streak, current_streak)
-        else:
-            current_streak = 0
+    # Calculate max streak (longest run of successes)
+    padded = np.concatenate(([0], success.view(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(padded))
+    runs = edges[1::2] - edges[::2]
+    max_streak = int(runs.max()) if runs.size else 0
     
     # BKT mastery count
     bkt_states = db.query(models.BKTSkillState).filter(
@@ -1589,13 +1649,12 @@ def get_achievements(user_id: int, db: Session = Depends(get_db)):
     ).count()
     
     # Flow state achieved (check if any session had flow)
-    flow_achieved = 1 if any(
-        a.success and a.reaction_time > 0 and a.reaction_time < 3
-        for a in all_attempts[-20:] if len(all_attempts) >= 20
+    flow_achieved = 1 if total_attempts >= 20 and np.any(
+        success[-20:] & (reaction_times[-20:] > 0) & (reaction_times[-20:] < 3)
     ) else 0
     
     # Fast reactions (< 1 second)
-    fast_reactions = sum(1 for a in all_attempts if a.success and 0 < a.reaction_time < 1.0)
+    fast_reactions = int(np.count_nonzero(success & (reaction_times > 0) & (reaction_times < 1.0)))
     
     # Consecutive days
     if all_attempts:
@@ -1623,8 +1682,8 @@ def get_achievements(user_id: int, db: Session = Depends(get_db)):
     # Improvement from first 20 to last 20
     improvement_pct = 0
     if total_attempts >= 40:
-        first_20_acc = sum(1 for a in all_attempts[:20] if a.success) / 20 * 100
-        last_20_acc = sum(1 for a in all_attempts[-20:] if a.success) / 20 * 100
+        first_20_acc = int(np.count_nonzero(success[:20])) / 20 * 100
+        last_20_acc = int(np.count_nonzero(success[-20:])) / 20 * 100
         improvement_pct = last_20_acc - first_20_acc
     
     # Build metrics map
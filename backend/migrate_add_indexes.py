@@ -0,0 +1,55 @@
+"""
+Migration script to add query indexes to existing tables.
+Supports both SQLite (local dev) and PostgreSQL (production).
+
+models.Base.metadata.create_all() only creates missing tables, so indexes
+declared on tables that already exist must be created separately.
+
+Indexes are matched by name only. When an index definition changes it gets a
+new name, and the index it replaces is listed in SUPERSEDED so it is dropped
+once its replacement exists.
+"""
+from sqlalchemy import inspect, text
+from database import engine
+import models
+
+# table -> index names replaced by a differently named index in models.py
+SUPERSEDED = {
+    # (user_id, timestamp) -> covering ix_attempt_user_ts_cov
+    'attempts': ['ix_attempt_user_ts'],
+}
+
+inspector = inspect(engine)
+existing_tables = set(inspector.get_table_names())
+
+for table in models.Base.metadata.sorted_tables:
+    if table.name not in existing_tables:
+        print(f"Table '{table.name}' does not exist yet; it will be created with its indexes on startup")
+        continue
+    
+    existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name in existing:
+            print(f"Index '{index.name}' already exists")
+        else:
+            print(f"Creating index {index.name} on {table.name}...")
+            try:
+                index.create(bind=engine)
+                print(f"Created index {index.name}")
+            except Exception as e:
+                print('Failed to create index', index.name, e)
+    
+    # Only drop what was replaced once every declared index is in place
+    existing = {ix["name"] for ix in inspect(engine).get_indexes(table.name)}
+    if all(index.name in existing for index in table.indexes):
+        for name in SUPERSEDED.get(table.name, []):
+            if name in existing:
+                print(f"Dropping superseded index {name} on {table.name}...")
+                try:
+                    with engine.begin() as conn:
+                        conn.execute(text(f"DROP INDEX {name}"))
+                    print(f"Dropped index {name}")
+                except Exception as e:
+                    print('Failed to drop index', name, e)
+
+print('Migration complete.')
@@ -0,0 +1,80 @@
+"""
+Migration script to add the attempt_count column to learning_profiles,
+backfilled from each user's recorded attempts.
+Supports both SQLite (local dev) and PostgreSQL (production).
+"""
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_URL = os.getenv('DATABASE_URL', 'sqlite:///./hero_dash.db')
+
+# Fix Render/Heroku postgres:// prefix
+if DB_URL.startswith('postgres://'):
+    DB_URL = DB_URL.replace('postgres://', 'postgresql://', 1)
+
+BACKFILL = (
+    "UPDATE learning_profiles SET attempt_count = "
+    "(SELECT COUNT(*) FROM attempts WHERE attempts.user_id = learning_profiles.user_id)"
+)
+
+if DB_URL.startswith('sqlite'):
+    # SQLite migration
+    import sqlite3
+    if DB_URL.startswith('sqlite:///'):
+        db_file = DB_URL.replace('sqlite:///', '')
+    else:
+        db_file = DB_URL
+    
+    print('Database file:', db_file)
+    if not os.path.exists(db_file):
+        print('DB file does not exist; nothing to migrate.')
+        exit(0)
+    
+    conn = sqlite3.connect(db_file)
+    cur = conn.cursor()
+    
+    cur.execute("PRAGMA table_info(learning_profiles);")
+    cols = [row[1] for row in cur.fetchall()]
+    
+    if 'attempt_count' in cols:
+        print("Column 'attempt_count' already exists")
+    else:
+        print('Adding column attempt_count...')
+        try:
+            cur.execute("ALTER TABLE learning_profiles ADD COLUMN attempt_count INTEGER DEFAULT 0")
+            cur.execute(BACKFILL)
+            conn.commit()
+            print('Added column attempt_count')
+        except Exception as e:
+            print('Failed to add column attempt_count', e)
+
+    conn.close()
+
+else:
+    # PostgreSQL migration using SQLAlchemy
+    from sqlalchemy import create_engine, text
+    
+    engine = create_engine(DB_URL)
+    
+    with engine.connect() as conn:
+        result = conn.execute(text(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = 'learning_profiles'"
+        ))
+        cols = [row[0] for row in result]
+        
+        if 'attempt_count' in cols:
+            print("Column 'attempt_count' already exists")
+        else:
+            print('Adding column attempt_count...')
+            try:
+                conn.execute(text("ALTER TABLE learning_profiles ADD COLUMN attempt_count INTEGER DEFAULT 0"))
+                conn.execute(text(BACKFILL))
+                conn.commit()
+                print('Added column attempt_count')
+            except Exception as e:
+                conn.rollback()
+                print('Failed to add column attempt_count', e)
+
+print('Migration complete.')
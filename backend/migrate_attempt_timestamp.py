@@ -0,0 +1,45 @@
+"""
+Migration script to make attempts.timestamp NOT NULL with a server default.
+Supports both SQLite (local dev) and PostgreSQL (production).
+
+SQLite cannot change column constraints in place; new local databases get
+them from create_all(), and the timestamp index is added by
+migrate_add_indexes.py on both backends.
+"""
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_URL = os.getenv('DATABASE_URL', 'sqlite:///./hero_dash.db')
+
+# Fix Render/Heroku postgres:// prefix
+if DB_URL.startswith('postgres://'):
+    DB_URL = DB_URL.replace('postgres://', 'postgresql://', 1)
+
+if DB_URL.startswith('sqlite'):
+    print('SQLite cannot alter column constraints; recreate the database to pick them up.')
+
+else:
+    # PostgreSQL migration using SQLAlchemy
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(DB_URL)
+
+    steps = [
+        ("Backfilling NULL timestamps", "UPDATE attempts SET timestamp = timezone('utc', now()) WHERE timestamp IS NULL"),
+        ("Setting server default", "ALTER TABLE attempts ALTER COLUMN timestamp SET DEFAULT timezone('utc', now())"),
+        ("Setting NOT NULL", "ALTER TABLE attempts ALTER COLUMN timestamp SET NOT NULL"),
+    ]
+
+    with engine.connect() as conn:
+        for label, sql in steps:
+            print(f"{label}...")
+            try:
+                conn.execute(text(sql))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print('Failed:', label, e)
+
+print('Migration complete.')
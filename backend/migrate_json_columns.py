@@ -0,0 +1,60 @@
+"""
+Migration script to convert JSON-as-text columns to native JSONB.
+Supports both SQLite (local dev) and PostgreSQL (production).
+
+SQLite stores the JSON type as TEXT, so existing rows already parse and
+nothing needs to change there. PostgreSQL columns created as TEXT are
+altered in place to JSONB.
+"""
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_URL = os.getenv('DATABASE_URL', 'sqlite:///./hero_dash.db')
+
+# Fix Render/Heroku postgres:// prefix
+if DB_URL.startswith('postgres://'):
+    DB_URL = DB_URL.replace('postgres://', 'postgresql://', 1)
+
+# (table, column) -> ALTER statement
+wanted = {
+    ('learning_profiles', 'bandit_params'):
+        "ALTER TABLE learning_profiles ALTER COLUMN bandit_params TYPE JSONB USING bandit_params::jsonb",
+    ('clinical_assessments', 'clinical_recommendations'):
+        "ALTER TABLE clinical_assessments ALTER COLUMN clinical_recommendations TYPE JSONB USING clinical_recommendations::jsonb",
+    ('assessment_sessions', 'scenario_results'):
+        "ALTER TABLE assessment_sessions ALTER COLUMN scenario_results TYPE JSONB USING scenario_results::jsonb",
+}
+
+if DB_URL.startswith('sqlite'):
+    print('SQLite stores JSON columns as TEXT; nothing to migrate.')
+
+else:
+    # PostgreSQL migration using SQLAlchemy
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(DB_URL)
+
+    with engine.connect() as conn:
+        for (table, col), sql in wanted.items():
+            result = conn.execute(text(
+                "SELECT data_type FROM information_schema.columns "
+                "WHERE table_name = :table AND column_name = :col"
+            ), {"table": table, "col": col})
+            row = result.first()
+            if row is None:
+                print(f"Column '{table}.{col}' does not exist yet; it will be created as JSONB on startup")
+            elif row[0] == 'jsonb':
+                print(f"Column '{table}.{col}' is already JSONB")
+            else:
+                print(f"Converting {table}.{col} from {row[0]} to JSONB...")
+                try:
+                    conn.execute(text(sql))
+                    conn.commit()
+                    print(f"Converted {table}.{col}")
+                except Exception as e:
+                    conn.rollback()
+                    print('Failed to convert column', f"{table}.{col}", e)
+
+print('Migration complete.')
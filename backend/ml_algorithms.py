@@ -4,12 +4,41 @@ Implements novel data science approaches for personalized auditory training
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from sqlalchemy import and_, case, func, select
 import models
 import numpy as np
-import json
+import math
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Optional
+from contextlib import contextmanager
+from itertools import groupby
+from statistics import median
+
+
+# ============================================================================
+# TRAINING-SESSION UNIT OF WORK
+# ============================================================================
+
+@contextmanager
+def training_session(db: Session):
+    """
+    Group ML state writes into one transaction.
+    
+    The update functions below (Thompson Sampling, SM-2, BKT) only mutate the
+    session; everything done inside the block is committed once on exit, or
+    rolled back if any update raises.
+    
+    Usage:
+        with ml_algorithms.training_session(db):
+            update_thompson_sampling(db, ...)
+            update_spaced_repetition(db, ...)
+    """
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
 
 
 # ============================================================================
@@ -34,32 +63,25 @@ def thompson_sampling_scenario_selection(db: Session, user_id: int) -> Tuple[str
     ).first()
     
     if not profile:
-        # Initialize profile with uniform priors
-        profile = models.UserLearningProfile(
-            user_id=user_id,
-            bandit_params=json.dumps({
-                "tsunami_siren": {"alpha": 1, "beta": 1},
-                "earthquake_alarm": {"alpha": 1, "beta": 1},
-                "flood_warning": {"alpha": 1, "beta": 1},
-                "air_raid_siren": {"alpha": 1, "beta": 1},
-                "building_fire_alarm": {"alpha": 1, "beta": 1}
-            })
-        )
+        # Initialize profile with uniform priors (bandit_params column default)
+        profile = models.UserLearningProfile(user_id=user_id)
         db.add(profile)
         db.commit()
         db.refresh(profile)
     
-    bandit_state = json.loads(profile.bandit_params)
+    bandit_state = profile.bandit_params
     
-    # Sample from Beta distributions (Thompson Sampling)
-    samples = {}
-    for scenario, params in bandit_state.items():
-        # Beta(alpha, beta) represents uncertainty about success probability
-        samples[scenario] = np.random.beta(params["alpha"], params["beta"])
+    # Sample from Beta distributions (Thompson Sampling), all arms in one draw
+    # Beta(alpha, beta) represents uncertainty about success probability
+    scenarios = list(bandit_state)
+    alphas = np.fromiter((p["alpha"] for p in bandit_state.values()), dtype=np.float64, count=len(scenarios))
+    betas = np.fromiter((p["beta"] for p in bandit_state.values()), dtype=np.float64, count=len(scenarios))
+    samples = np.random.beta(alphas, betas)
     
     # Select scenario with highest sample
-    selected = max(samples, key=samples.get)
-    learning_potential = samples[selected]
+    best = int(samples.argmax())
+    selected = scenarios[best]
+    learning_potential = float(samples[best])
     
     return selected, bandit_state, learning_potential
 
@@ -72,6 +94,8 @@ def update_thompson_sampling(db: Session, user_id: int, scenario_type: str,
     
     Args:
         learning_gain: 0-1, where higher means more learning occurred
+    
+    Mutates the session only; the caller commits.
     """
     profile = db.query(models.UserLearningProfile).filter(
         models.UserLearningProfile.user_id == user_id
@@ -80,18 +104,18 @@ def update_thompson_sampling(db: Session, user_id: int, scenario_type: str,
     if not profile:
         return
     
-    bandit_state = json.loads(profile.bandit_params)
+    arm = dict(profile.bandit_params[scenario_type])
     
     # Update Beta distribution parameters
     # High learning gain = reward (increase alpha)
     # Low learning gain = no reward (increase beta)
     if learning_gain > 0.4:  # Significant learning threshold
-        bandit_state[scenario_type]["alpha"] += learning_gain
+        arm["alpha"] += learning_gain
     else:
-        bandit_state[scenario_type]["beta"] += (1 - learning_gain)
+        arm["beta"] += (1 - learning_gain)
     
-    profile.bandit_params = json.dumps(bandit_state)
-    db.commit()
+    # Reassign the top-level key so MutableDict marks the column changed
+    profile.bandit_params[scenario_type] = arm
 
 
 def calculate_learning_gain(db: Session, user_id: int, scenario_type: str, 
@@ -106,20 +130,22 @@ def calculate_learning_gain(db: Session, user_id: int, scenario_type: str,
     Returns: 0-1 score representing learning value
     """
     # Get historical performance for this scenario
-    past_attempts = db.query(models.Attempt).filter(
+    past_attempts = db.execute(select(models.Attempt.success, models.Attempt.reaction_time).where(
         and_(
             models.Attempt.user_id == user_id,
             models.Attempt.scenario_type == scenario_type
         )
-    ).order_by(models.Attempt.timestamp.desc()).limit(10).all()
+    ).order_by(models.Attempt.timestamp.desc()).limit(10)).all()
     
     if len(past_attempts) < 3:
         # Early learning phase - any success is high gain
         return 0.8 if current_success else 0.4
     
     # Calculate baseline performance
-    baseline_success_rate = sum(1 for a in past_attempts if a.success) / len(past_attempts)
-    baseline_rt = np.mean([a.reaction_time for a in past_attempts if a.reaction_time > 0])
+    arr = np.fromiter(map(tuple, past_attempts), dtype=[("s", "?"), ("rt", "f8")], count=len(past_attempts))
+    baseline_success_rate = arr["s"].mean()
+    valid_rt = arr["rt"][arr["rt"] > 0]
+    baseline_rt = valid_rt.mean() if valid_rt.size else 0
     
     # Learning gain components
     success_gain = 0.5 if current_success else 0.0
@@ -162,11 +188,27 @@ def calculate_memory_decay(db: Session, user_id: int, scenario_type: str) -> flo
     if not skill:
         return 0.0  # No memory established yet
     
-    time_elapsed = (datetime.utcnow() - skill.last_practiced).total_seconds() / 86400  # days
-    decay_rate = 1 / (skill.easiness_factor * max(skill.interval_days, 0.1))
+    return float(memory_strengths([skill])[0])
+
+
+def memory_strengths(skills: List[models.SkillMemoryState], now: Optional[datetime] = None) -> np.ndarray:
+    """
+    Ebbinghaus decay for already-loaded SkillMemoryState rows (no query),
+    computed for all skills in one vectorized pass.
     
-    current_strength = skill.memory_strength * np.exp(-decay_rate * time_elapsed)
-    return max(0.0, min(1.0, current_strength))
+    Returns: Array of current memory strengths (0-1), aligned with skills
+    """
+    now = now or datetime.utcnow()
+    n = len(skills)
+    time_elapsed = np.fromiter(
+        ((now - s.last_practiced).total_seconds() / 86400 for s in skills), dtype=np.float64, count=n
+    )  # days
+    easiness = np.fromiter((s.easiness_factor for s in skills), dtype=np.float64, count=n)
+    interval = np.fromiter((s.interval_days for s in skills), dtype=np.float64, count=n)
+    strength = np.fromiter((s.memory_strength for s in skills), dtype=np.float64, count=n)
+    
+    decay_rate = 1 / (easiness * np.maximum(interval, 0.1))
+    return np.clip(strength * np.exp(-decay_rate * time_elapsed), 0.0, 1.0)
 
 
 def update_spaced_repetition(db: Session, user_id: int, scenario_type: str, 
@@ -182,6 +224,8 @@ def update_spaced_repetition(db: Session, user_id: int, scenario_type: str,
             3 = correct with some hesitation
             4 = correct easily
             5 = perfect recall
+    
+    Mutates the session only; the caller commits.
     """
     skill = db.query(models.SkillMemoryState).filter(
         and_(
@@ -228,32 +272,42 @@ def update_spaced_repetition(db: Session, user_id: int, scenario_type: str,
     skill.memory_strength = min(1.0, skill.memory_strength + quality / 10.0)
     skill.last_practiced = datetime.utcnow()
     skill.next_review_date = datetime.utcnow() + timedelta(days=skill.interval_days)
+
+
+def get_due_review_strengths(db: Session, user_id: int,
+                             skills: Optional[List[models.SkillMemoryState]] = None) -> List[Tuple[str, float]]:
+    """
+    Get (scenario_type, current memory strength) for every skill due for
+    review, most urgent (weakest memory) first. Decay is computed on the
+    rows already fetched, so this is a single query.
     
-    db.commit()
+    Args:
+        skills: Optional already-loaded states (e.g. User.skill_memories);
+            due ones are filtered in memory instead of queried
+    """
+    now = datetime.utcnow()
+    if skills is not None:
+        skills = [skill for skill in skills if skill.next_review_date <= now]
+    else:
+        skills = db.query(models.SkillMemoryState).filter(
+            and_(
+                models.SkillMemoryState.user_id == user_id,
+                models.SkillMemoryState.next_review_date <= now
+            )
+        ).all()
+    
+    # Lower memory strength = higher urgency
+    strengths = memory_strengths(skills, now)
+    return [(skills[i].scenario_type, float(strengths[i])) for i in np.argsort(strengths, kind="stable")]
 
 
-def get_due_for_review(db: Session, user_id: int) -> List[str]:
+def get_due_for_review(db: Session, user_id: int,
+                       skills: Optional[List[models.SkillMemoryState]] = None) -> List[str]:
     """
     Get list of scenarios that are due for spaced repetition review.
     Prioritize skills with weakening memory.
     """
-    skills = db.query(models.SkillMemoryState).filter(
-        and_(
-            models.SkillMemoryState.user_id == user_id,
-            models.SkillMemoryState.next_review_date <= datetime.utcnow()
-        )
-    ).all()
-    
-    # Calculate urgency score (lower memory strength = higher urgency)
-    urgent_skills = []
-    for skill in skills:
-        current_strength = calculate_memory_decay(db, user_id, skill.scenario_type)
-        urgency = 1 - current_strength
-        urgent_skills.append((skill.scenario_type, urgency))
-    
-    # Sort by urgency
-    urgent_skills.sort(key=lambda x: x[1], reverse=True)
-    return [s[0] for s in urgent_skills]
+    return [scenario for scenario, _ in get_due_review_strengths(db, user_id, skills)]
 
 
 # ============================================================================
@@ -269,30 +323,35 @@ def calculate_cognitive_load(db: Session, user_id: int, window_minutes: int = 10
     
     Returns: Cognitive load score 0-1 (0=low, 1=high)
     """
-    recent = db.query(models.Attempt).filter(
+    recent = db.execute(select(models.Attempt.success, models.Attempt.reaction_time).where(
         and_(
             models.Attempt.user_id == user_id,
             models.Attempt.timestamp > datetime.utcnow() - timedelta(minutes=window_minutes)
         )
-    ).order_by(models.Attempt.timestamp).all()
+    ).order_by(models.Attempt.timestamp)).all()
     
     if len(recent) < 3:
         return 0.5  # Neutral load (insufficient data)
     
-    # Extract metrics
-    reaction_times = [a.reaction_time for a in recent if a.reaction_time > 0]
-    success_rate = sum(1 for a in recent if a.success) / len(recent)
+    # Extract metrics as arrays (one C-level pass per reduction)
+    succ = np.fromiter((a.success for a in recent), dtype=bool, count=len(recent))
+    rt_all = np.fromiter((a.reaction_time for a in recent), dtype=np.float64, count=len(recent))
+    reaction_times = rt_all[rt_all > 0]
+    success_rate = succ.mean()
     
-    if not reaction_times:
+    if not reaction_times.size:
         return 0.5
     
     # 1. Reaction time variance (high variance = distraction/fatigue)
-    rt_variance = np.var(reaction_times) if len(reaction_times) > 1 else 0
+    rt_variance = reaction_times.var() if reaction_times.size > 1 else 0
     rt_normalized_var = min(1.0, rt_variance / 2.0)
     
     # 2. Reaction time trend (increasing = fatigue)
-    if len(reaction_times) > 2:
-        rt_trend = np.polyfit(range(len(reaction_times)), reaction_times, 1)[0]
+    if reaction_times.size > 2:
+        # Closed-form OLS slope against x = 0..n-1: sum((x - x̄)·y) / sum((x - x̄)²),
+        # where sum((x - x̄)²) = n(n² - 1)/12
+        n = reaction_times.size
+        rt_trend = (np.arange(n) - (n - 1) / 2) @ reaction_times / (n * (n * n - 1) / 12)
         rt_trend_score = max(0, rt_trend * 10)  # Positive slope = increasing RT
     else:
         rt_trend_score = 0
@@ -301,14 +360,11 @@ def calculate_cognitive_load(db: Session, user_id: int, window_minutes: int = 10
     error_score = 1 - success_rate
     
     # 4. Error clustering (consecutive errors indicate overload)
-    consecutive_errors = 0
-    max_consecutive = 0
-    for attempt in recent:
-        if not attempt.success:
-            consecutive_errors += 1
-            max_consecutive = max(max_consecutive, consecutive_errors)
-        else:
-            consecutive_errors = 0
+    # Run-length encode failures: edges of each run of 1s in the padded mask
+    fail = np.concatenate(([0], (~succ).view(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(fail))
+    runs = edges[1::2] - edges[::2]
+    max_consecutive = int(runs.max()) if runs.size else 0
     error_clustering = min(1.0, max_consecutive / 3)
     
     # Weighted combination
@@ -322,7 +378,8 @@ def calculate_cognitive_load(db: Session, user_id: int, window_minutes: int = 10
     return float(min(1.0, max(0.0, cognitive_load)))
 
 
-def detect_flow_state(db: Session, user_id: int, current_session_id: Optional[int] = None) -> Dict:
+def detect_flow_state(db: Session, user_id: int, current_session_id: Optional[int] = None,
+                      cognitive_load: Optional[float] = None) -> Dict:
     """
     Detect if user is in 'flow state' (optimal learning zone)
     Based on Csikszentmihalyi's flow theory:
@@ -330,6 +387,10 @@ def detect_flow_state(db: Session, user_id: int, current_session_id: Optional[in
     - High engagement (consistent performance)
     - Moderate success rate (60-85%)
     
+    Args:
+        cognitive_load: Optional load the caller already computed with
+            calculate_cognitive_load; reused instead of re-querying
+    
     Returns: Flow state analysis with recommendations
     """
     # Get current session attempts
@@ -339,20 +400,20 @@ def detect_flow_state(db: Session, user_id: int, current_session_id: Optional[in
         ).first()
         
         if session:
-            attempts = db.query(models.Attempt).filter(
+            attempts = db.execute(select(models.Attempt.success, models.Attempt.reaction_time).where(
                 and_(
                     models.Attempt.user_id == user_id,
                     models.Attempt.timestamp >= session.session_start,
                     models.Attempt.timestamp <= (session.session_end or datetime.utcnow())
                 )
-            ).all()
+            )).all()
         else:
             attempts = []
     else:
         # Use recent attempts
-        attempts = db.query(models.Attempt).filter(
+        attempts = db.execute(select(models.Attempt.success, models.Attempt.reaction_time).where(
             models.Attempt.user_id == user_id
-        ).order_by(models.Attempt.timestamp.desc()).limit(20).all()
+        ).order_by(models.Attempt.timestamp.desc()).limit(20)).all()
     
     if len(attempts) < 5:
         return {
@@ -364,17 +425,18 @@ def detect_flow_state(db: Session, user_id: int, current_session_id: Optional[in
             "consistency_score": 0.5
         }
     
-    # Calculate flow indicators
-    success_rate = sum(1 for a in attempts if a.success) / len(attempts)
-    reaction_times = [a.reaction_time for a in attempts if a.reaction_time > 0]
+    # Calculate flow indicators (one structured array, C-level reductions)
+    arr = np.fromiter(map(tuple, attempts), dtype=[("s", "?"), ("rt", "f8")], count=len(attempts))
+    success_rate = arr["s"].mean()
+    reaction_times = arr["rt"][arr["rt"] > 0]
     
-    if not reaction_times:
+    if not reaction_times.size:
         rt_variance = 999
         rt_cv = 999
         rt_mean = 0
     else:
-        rt_variance = np.var(reaction_times) if len(reaction_times) > 1 else 0
-        rt_mean = np.mean(reaction_times) if len(reaction_times) > 0 else 0
+        rt_variance = reaction_times.var() if reaction_times.size > 1 else 0
+        rt_mean = reaction_times.mean()
         rt_cv = (np.sqrt(rt_variance) / rt_mean) if rt_mean > 0 else 999  # Coefficient of variation
     
     # Flow criteria:
@@ -407,7 +469,7 @@ def detect_flow_state(db: Session, user_id: int, current_session_id: Optional[in
         "consistency_score": float(1 / (1 + rt_cv) if rt_cv != 999 else 0.5),
         "recommendation": recommendation,
         "reason": reason,
-        "cognitive_load": calculate_cognitive_load(db, user_id)
+        "cognitive_load": cognitive_load if cognitive_load is not None else calculate_cognitive_load(db, user_id)
     }
 
 
@@ -415,46 +477,64 @@ def detect_flow_state(db: Session, user_id: int, current_session_id: Optional[in
 # 4. CLINICAL ASSESSMENT METRICS
 # ============================================================================
 
-def calculate_clinical_scores(db: Session, user_id: int) -> Optional[Dict]:
+def calculate_clinical_scores(db: Session, user_id: int,
+                              ended_sessions: Optional[int] = None) -> Optional[Dict]:
     """
     Calculate standardized clinical scores aligned with:
     - SCAN-C (Screening Test for Auditory Processing Disorders in Children)
     - CHAPPS (Children's Auditory Performance Scale)
     
+    ended_sessions: the user's ended-session count, if the caller already has
+    it; passed on to calculate_attention_span.
+    
     Returns: Dictionary of clinical scores or None if insufficient data
     """
-    all_attempts = db.query(models.Attempt).filter(
+    # All score inputs as one aggregate row over the last 100 attempts
+    recent = select(
+        models.Attempt.success, models.Attempt.noise_level, models.Attempt.reaction_time
+    ).where(
         models.Attempt.user_id == user_id
-    ).order_by(models.Attempt.timestamp.desc()).limit(100).all()
-    
-    if len(all_attempts) < 20:
+    ).order_by(models.Attempt.timestamp.desc()).limit(100).subquery()
+    
+    succeeded = case((recent.c.success, 1), else_=0)
+    high_noise = recent.c.noise_level > 0.5
+    positive_rt = case((recent.c.reaction_time > 0, recent.c.reaction_time))
+    (total, successes, high_noise_total, high_noise_successes,
+     rt_count, rt_mean, rt_variance) = db.execute(select(
+        func.count(),
+        func.sum(succeeded),
+        func.sum(case((high_noise, 1), else_=0)),
+        func.sum(case((high_noise, succeeded), else_=0)),
+        func.count(positive_rt),
+        func.avg(positive_rt),
+        func.var_pop(positive_rt)
+    ).select_from(recent)).one()
+    
+    if total < 20:
         return None  # Need minimum data
     
     # 1. Figure-Ground Discrimination Score
     # Ability to identify signals in noise
-    high_noise_attempts = [a for a in all_attempts if a.noise_level > 0.5]
-    if high_noise_attempts:
-        fg_score = (sum(1 for a in high_noise_attempts if a.success) / len(high_noise_attempts)) * 100
+    if high_noise_total:
+        fg_score = high_noise_successes / high_noise_total * 100
     else:
         fg_score = 50.0  # Default
     
     # 2. Temporal Processing Score
     # Based on reaction time consistency
-    reaction_times = [a.reaction_time for a in all_attempts if a.reaction_time > 0]
-    if len(reaction_times) > 1:
-        rt_mean = np.mean(reaction_times)
-        rt_std = np.std(reaction_times)
+    if rt_count > 1:
+        rt_std = math.sqrt(max(0.0, rt_variance))
         # Lower variance = better temporal processing
-        temporal_score = max(0, 100 - (rt_std / rt_mean * 100)) if rt_mean > 0 else 50
+        temporal_score = max(0, 100 - (rt_std / rt_mean * 100))
     else:
         temporal_score = 50.0
     
     # 3. Sound Localization/Discrimination Score
     # Overall accuracy across all scenarios
-    overall_success = sum(1 for a in all_attempts if a.success) / len(all_attempts) * 100
+    overall_success = successes / total * 100
     
     # 4. Auditory Attention Span
-    attention_span = calculate_attention_span(db, user_id)
+    attention_span = calculate_attention_span(db, user_id, ended_sessions)
     
     # 5. Composite Score
     composite = (fg_score + temporal_score + overall_success) / 3
@@ -468,63 +548,116 @@ def calculate_clinical_scores(db: Session, user_id: int) -> Optional[Dict]:
     }
 
 
-def calculate_attention_span(db: Session, user_id: int) -> float:
+def _scan_fatigue(success: np.ndarray, window_size: int) -> int:
+    """
+    Index of the first window whose success rate drops below 0.5, or -1.
+    
+    Rolling success rate for every window start comes from one prefix sum
+    over the 0/1 success flags of a single session.
+    """
+    csum = np.concatenate(([0], success.cumsum()))
+    rates = (csum[window_size:-1] - csum[:-window_size - 1]) / window_size
+    
+    degraded = rates < 0.5  # Performance degradation threshold
+    return int(np.argmax(degraded)) if degraded.any() else -1
+
+
+DEFAULT_ATTENTION_SPAN = 300.0  # seconds (5 minutes)
+
+
+def calculate_attention_span(db: Session, user_id: int,
+                             ended_sessions: Optional[int] = None) -> float:
     """
     Find the duration after which performance starts declining.
     This indicates attention fatigue threshold.
     
+    ended_sessions: the user's ended-session count, if the caller already has
+    it; with none ended the default is returned without querying.
+    
     Returns: Attention span in seconds
     """
-    sessions = db.query(models.SessionMetrics).filter(
-        models.SessionMetrics.user_id == user_id
+    if ended_sessions == 0:
+        return DEFAULT_ATTENTION_SPAN
+    
+    # One query for every ended session's attempts instead of one per session
+    rows = db.execute(
+        select(
+            models.SessionMetrics.id,
+            models.SessionMetrics.session_start,
+            models.Attempt.timestamp,
+            models.Attempt.success
+        ).join(
+            models.Attempt,
+            and_(
+                models.Attempt.user_id == models.SessionMetrics.user_id,
+                models.Attempt.timestamp >= models.SessionMetrics.session_start,
+                models.Attempt.timestamp <= models.SessionMetrics.session_end
+            )
+        ).where(
+            models.SessionMetrics.user_id == user_id,
+            models.SessionMetrics.session_end.isnot(None)
+        ).order_by(models.SessionMetrics.id, models.Attempt.timestamp)
     ).all()
     
+    success = np.fromiter((r.success for r in rows), dtype=np.int64, count=len(rows))
+    # Attempt offsets from their session start as int64 microseconds, so no
+    # timedelta is built per row
+    elapsed_us = (
+        np.array([r.timestamp for r in rows], dtype="datetime64[us]").view(np.int64)
+        - np.array([r.session_start for r in rows], dtype="datetime64[us]").view(np.int64)
+    )
     attention_spans = []
     
-    for session in sessions:
-        if not session.session_end:
-            continue
-            
-        attempts = db.query(models.Attempt).filter(
-            and_(
-                models.Attempt.user_id == user_id,
-                models.Attempt.timestamp >= session.session_start,
-                models.Attempt.timestamp <= session.session_end
-            )
-        ).order_by(models.Attempt.timestamp).all()
-        
-        if len(attempts) < 10:
-            continue
+    start = 0
+    for _, session_rows in groupby(rows, key=lambda r: r[0]):
+        end = start + sum(1 for _ in session_rows)
         
-        # Find inflection point where success rate drops
-        window_size = 5
-        for i in range(len(attempts) - window_size):
-            window = attempts[i:i+window_size]
-            success_rate = sum(1 for a in window if a.success) / window_size
-            
-            if success_rate < 0.5:  # Performance degradation threshold
-                time_to_fatigue = (window[0].timestamp - session.session_start).total_seconds()
-                attention_spans.append(time_to_fatigue)
-                break
+        if end - start >= 10:
+            i = _scan_fatigue(success[start:end], window_size=5)
+            if i >= 0:
+                attention_spans.append(int(elapsed_us[start + i]) / 1e6)
+        start = end
     
     if attention_spans:
-        return float(np.median(attention_spans))
+        return float(median(attention_spans))
     else:
-        return 300.0  # Default 5 minutes
+        return DEFAULT_ATTENTION_SPAN
 
 
-def generate_clinical_recommendations(db: Session, user_id: int) -> List[Dict]:
+def generate_clinical_recommendations(db: Session, user_id: int,
+                                      clinical_scores: Optional[Dict] = None) -> List[Dict]:
     """
     Generate evidence-based recommendations for therapists/parents.
+    
+    clinical_scores: output of calculate_clinical_scores, if the caller has
+    it. Its temporal processing score (100 - RT CV%) then drives the attention
+    check instead of re-deriving RT statistics here.
     """
     recommendations = []
     
-    # Get performance by scenario
-    all_attempts = db.query(models.Attempt).filter(
-        models.Attempt.user_id == user_id
+    # Get performance by scenario (grouped in SQL, first-seen scenario first);
+    # without clinical scores, the positive reaction-time moments needed for
+    # the attention check are aggregated per group in the same pass
+    columns = [
+        models.Attempt.scenario_type,
+        func.count(),
+        func.sum(case((models.Attempt.success, 1), else_=0))
+    ]
+    if clinical_scores is None:
+        positive_rt = case((models.Attempt.reaction_time > 0, models.Attempt.reaction_time))
+        columns += [
+            func.count(positive_rt),
+            func.avg(positive_rt),
+            func.var_pop(positive_rt)
+        ]
+    scenario_stats = db.execute(
+        select(*columns)
+        .where(models.Attempt.user_id == user_id)
+        .group_by(models.Attempt.scenario_type)
+        .order_by(func.min(models.Attempt.id))
     ).all()
     
-    if len(all_attempts) < 10:
+    if sum(row[1] for row in scenario_stats) < 10:
         return [{
             "area": "data_collection",
             "severity": "info",
@@ -532,48 +665,58 @@ def generate_clinical_recommendations(db: Session, user_id: int) -> List[Dict]:
             "clinical_note": "Minimum 20 attempts needed for meaningful assessment"
         }]
     
-    # Analyze by scenario type
-    from collections import defaultdict
-    scenario_stats = defaultdict(lambda: {"total": 0, "success": 0})
-    
-    for attempt in all_attempts:
-        scenario_stats[attempt.scenario_type]["total"] += 1
-        if attempt.success:
-            scenario_stats[attempt.scenario_type]["success"] += 1
-    
-    # Check for specific deficits
-    for scenario, stats in scenario_stats.items():
-        if stats["total"] > 5:
-            success_rate = stats["success"] / stats["total"]
-            
-            if success_rate < 0.5:
-                recommendations.append({
-                    "area": f"{scenario.title()} Recognition",
-                    "severity": "high_priority",
-                    "suggestion": f"Increase exposure to {scenario} sounds in controlled environment",
-                    "clinical_note": "Consider frequency-specific hearing assessment"
-                })
-            elif success_rate < 0.7:
-                recommendations.append({
-                    "area": f"{scenario.title()} Recognition",
-                    "severity": "moderate",
-                    "suggestion": f"Additional practice recommended for {scenario} scenarios",
-                    "clinical_note": "Monitor progress over next 2 weeks"
-                })
-    
-    # Check for attention issues
-    reaction_times = [a.reaction_time for a in all_attempts if a.reaction_time > 0]
-    if reaction_times and len(reaction_times) > 5:
-        rt_cv = np.std(reaction_times) / np.mean(reaction_times)
-        
-        if rt_cv > 0.5:
+    # Check for specific deficits (threshold masks over all scenarios at once)
+    totals = np.array([row[1] for row in scenario_stats], dtype=np.int64)
+    successes = np.array([row[2] for row in scenario_stats], dtype=np.int64)
+    success_rates = successes / np.maximum(totals, 1)
+    enough_data = totals > 5
+    high_priority = enough_data & (success_rates < 0.5)
+    moderate = enough_data & ~high_priority & (success_rates < 0.7)
+    
+    for i in np.flatnonzero(high_priority | moderate):
+        scenario = scenario_stats[i][0]
+        if high_priority[i]:
             recommendations.append({
-                "area": "Attention Consistency",
+                "area": f"{scenario.title()} Recognition",
+                "severity": "high_priority",
+                "suggestion": f"Increase exposure to {scenario} sounds in controlled environment",
+                "clinical_note": "Consider frequency-specific hearing assessment"
+            })
+        else:
+            recommendations.append({
+                "area": f"{scenario.title()} Recognition",
                 "severity": "moderate",
-                "suggestion": "Implement shorter, more frequent training sessions (10-15 min)",
-                "clinical_note": "High RT variability may indicate attention difficulties"
+                "suggestion": f"Additional practice recommended for {scenario} scenarios",
+                "clinical_note": "Monitor progress over next 2 weeks"
             })
     
+    # Check for attention issues
+    if clinical_scores is not None:
+        # temporal_processing_score = max(0, 100 - CV%), so CV > 0.5 <=> score < 50
+        rt_cv = (100 - clinical_scores["temporal_processing_score"]) / 100
+    else:
+        # Merge the per-scenario (count, mean, var_pop) into overall moments
+        # (Chan et al. pairwise update), avoiding E[X²] - E[X]² cancellation
+        rt_count, rt_mean, rt_m2 = 0, 0.0, 0.0
+        for *_, n, mean, var in scenario_stats:
+            if not n:
+                continue
+            total = rt_count + n
+            delta = mean - rt_mean
+            rt_mean += delta * n / total
+            rt_m2 += var * n + delta * delta * rt_count * n / total
+            rt_count = total
+        
+        rt_cv = math.sqrt(rt_m2 / rt_count) / rt_mean if rt_count > 5 else 0.0
+    
+    if rt_cv > 0.5:
+        recommendations.append({
+            "area": "Attention Consistency",
+            "severity": "moderate",
+            "suggestion": "Implement shorter, more frequent training sessions (10-15 min)",
+            "clinical_note": "High RT variability may indicate attention difficulties"
+        })
+    
     # Check cognitive load
     cognitive_load = calculate_cognitive_load(db, user_id, window_minutes=60)
     if cognitive_load > 0.7:
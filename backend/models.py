@@ -1,8 +1,29 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Index, JSON
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.mutable import MutableDict
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql.expression import FunctionElement
 from database import Base
 from datetime import datetime
 
+
+class utcnow(FunctionElement):
+    """Current time as naive UTC, for server defaults (matches datetime.utcnow)."""
+    type = DateTime()
+    inherit_cache = True
+
+@compiles(utcnow, "postgresql")
+def _pg_utcnow(element, compiler, **kw):
+    # now() is local to the server's TimeZone; TIMESTAMP WITHOUT TIME ZONE needs UTC
+    return "timezone('utc', now())"
+
+@compiles(utcnow)
+def _default_utcnow(element, compiler, **kw):
+    # SQLite's CURRENT_TIMESTAMP is already UTC
+    return "CURRENT_TIMESTAMP"
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -28,6 +49,17 @@ class User(Base):
 
 class Attempt(Base):
     __tablename__ = "attempts"
+    __table_args__ = (
+        # Per-user history scans: WHERE user_id = ? ORDER BY timestamp DESC LIMIT n
+        # On PostgreSQL the INCLUDE columns let the analytics/IRT reads that
+        # select only these fields run as index-only scans. Named apart from
+        # the earlier plain ix_attempt_user_ts so migrate_add_indexes.py
+        # builds it (and drops the old one) on existing databases
+        Index(
+            "ix_attempt_user_ts_cov", "user_id", "timestamp",
+            postgresql_include=["success", "reaction_time", "scenario_type", "noise_level"]
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -35,7 +67,11 @@ class Attempt(Base):
     scenario_type = Column(String(50)) # tsunami_siren, earthquake_alarm, etc.
     success = Column(Boolean)
     reaction_time = Column(Float) # seconds
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    # Python default for ORM/Core inserts; server default covers raw SQL inserts.
+    # Both are naive UTC, like every other timestamp here
+    timestamp = Column(DateTime, default=datetime.utcnow,
+                       server_default=utcnow(),
+                       nullable=False, index=True)
     
     # Context of the attempt
     difficulty_level = Column(Integer)
@@ -60,6 +96,7 @@ class UserLearningProfile(Base):
     # Cognitive Load Metrics
     avg_reaction_time = Column(Float, default=0.0)
     reaction_time_variance = Column(Float, default=0.0)
+    attempt_count = Column(Integer, default=0)  # attempts applied to this profile
     
     # Auditory Processing Metrics
     frequency_discrimination_score = Column(Float, default=0.0)
@@ -74,8 +111,18 @@ class UserLearningProfile(Base):
     fatigue_threshold = Column(Float, default=0.7)
     
     # Multi-Armed Bandit State (Thompson Sampling parameters as JSON)
-    # Stores alpha/beta for each scenario type
-    bandit_params = Column(Text, default='{"tsunami_siren":{"alpha":1,"beta":1},"earthquake_alarm":{"alpha":1,"beta":1},"flood_warning":{"alpha":1,"beta":1},"air_raid_siren":{"alpha":1,"beta":1},"building_fire_alarm":{"alpha":1,"beta":1}}')
+    # Stores alpha/beta for each scenario type. JSONB on PostgreSQL; the
+    # MutableDict wrapper flags the row dirty when a top-level key is set.
+    bandit_params = Column(
+        MutableDict.as_mutable(JSON().with_variant(JSONB, "postgresql")),
+        default=lambda: {
+            "tsunami_siren": {"alpha": 1, "beta": 1},
+            "earthquake_alarm": {"alpha": 1, "beta": 1},
+            "flood_warning": {"alpha": 1, "beta": 1},
+            "air_raid_siren": {"alpha": 1, "beta": 1},
+            "building_fire_alarm": {"alpha": 1, "beta": 1}
+        }
+    )
     
     user = relationship("User", back_populates="learning_profile")
 
@@ -108,7 +155,12 @@ class SessionMetrics(Base):
     Based on Csikszentmihalyi's flow theory
     """
     __tablename__ = "session_metrics"
-    
+    __table_args__ = (
+        # Per-user session reads (attention span, flow state, dashboards);
+        # session_start also bounds the joined attempt range scans
+        Index("ix_session_metrics_user_start", "user_id", "session_start"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     session_start = Column(DateTime, default=datetime.utcnow)
@@ -158,7 +210,7 @@ class ClinicalAssessment(Base):
     weeks_of_training = Column(Integer, default=0)
     
     # Recommendations from algorithm
-    clinical_recommendations = Column(Text, default="[]")  # JSON array
+    clinical_recommendations = Column(JSON().with_variant(JSONB, "postgresql"), default=list)  # JSON array
     
     user = relationship("User", back_populates="clinical_assessments")
 
@@ -251,8 +303,11 @@ class AssessmentSession(Base):
     overall_accuracy = Column(Float, default=0.0)
     avg_reaction_time = Column(Float, default=0.0)
     
-    # Per-scenario results (JSON)
-    scenario_results = Column(Text, default="{}")
+    # Per-scenario results (JSONB on PostgreSQL). MutableDict only tracks
+    # top-level keys, so edit a deep copy and assign it back to the column.
+    scenario_results = Column(
+        MutableDict.as_mutable(JSON().with_variant(JSONB, "postgresql")), default=dict
+    )
     
     # Comparison metrics (only for post_test)
     improvement_vs_baseline = Column(Float, nullable=True)
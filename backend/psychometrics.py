@@ -23,8 +23,13 @@ from sqlalchemy.orm import Session
 from sqlalchemy import and_, func
 import models
 import numpy as np
+import math
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
+from itertools import accumulate
+# Per-user samples here are small (a handful of windows or scenarios), so
+# their stats use plain floats rather than an ndarray round trip
+from statistics import fmean, stdev
 from scipy import stats as scipy_stats
 
 
@@ -133,7 +138,7 @@ def calculate_cronbachs_alpha(db: Session, user_id: int, min_sessions: int = 3)
     Returns: alpha value or None if insufficient data
     """
     # Get sessions with enough data
-    sessions = db.query(models.SessionMetrics).filter(
+    sessions = db.query(models.SessionMetrics.session_start, models.SessionMetrics.session_end).filter(
         and_(
             models.SessionMetrics.user_id == user_id,
             models.SessionMetrics.session_end.isnot(None)
@@ -150,7 +155,7 @@ def calculate_cronbachs_alpha(db: Session, user_id: int, min_sessions: int = 3)
     for session in sessions:
         session_scores = []
         for scenario in scenarios:
-            attempts = db.query(models.Attempt).filter(
+            attempts = db.query(models.Attempt.success).filter(
                 and_(
                     models.Attempt.user_id == user_id,
                     models.Attempt.scenario_type == scenario,
@@ -215,8 +220,7 @@ def calculate_test_retest_reliability(db: Session, user_id: int) -> Optional[Dic
     scores_2 = []
     
     for assessment in assessments[:2]:
-        import json
-        results = json.loads(assessment.scenario_results or "{}")
+        results = assessment.scenario_results or {}
         for scenario in ["tsunami_siren", "earthquake_alarm", "flood_warning", "air_raid_siren", "building_fire_alarm"]:
             score = results.get(scenario, {}).get("accuracy", 50)
             if assessment == assessments[0]:
@@ -262,26 +266,27 @@ def calculate_sem(db: Session, user_id: int) -> Optional[Dict]:
         return None
     
     # Get SD of composite scores
-    attempts = db.query(models.Attempt).filter(
+    successes = [a.success for a in db.query(models.Attempt.success).filter(
         models.Attempt.user_id == user_id
-    ).all()
+    )]
     
-    if len(attempts) < 20:
+    if len(successes) < 20:
         return None
     
-    # Calculate composite scores in sliding windows
+    # Calculate composite scores in sliding windows from a running sum
+    # (each window is a difference of two prefix sums, not a re-count)
     window = 20
-    composite_scores = []
-    for i in range(0, len(attempts) - window, window // 2):
-        chunk = attempts[i:i + window]
-        score = sum(1 for a in chunk if a.success) / len(chunk) * 100
-        composite_scores.append(score)
+    prefix = [0, *accumulate(successes)]
+    composite_scores = [
+        (prefix[i + window] - prefix[i]) / window * 100
+        for i in range(0, len(successes) - window, window // 2)
+    ]
     
     if len(composite_scores) < 3:
         return None
     
-    sd = np.std(composite_scores, ddof=1)
-    sem = sd * np.sqrt(1 - max(0, alpha))
+    sd = stdev(composite_scores)
+    sem = sd * math.sqrt(1 - max(0, alpha))
     
     return {
         "sem": round(float(sem), 2),
@@ -332,18 +337,18 @@ def calculate_effect_size(pre_scores: List[float], post_scores: List[float]) ->
     
     Returns: Dict with effect size, CI, and interpretation
     """
-    if not pre_scores or not post_scores:
+    if len(pre_scores) < 2 or len(post_scores) < 2:
         return {"error": "Insufficient data"}
     
-    m1 = np.mean(pre_scores)
-    m2 = np.mean(post_scores)
-    s1 = np.std(pre_scores, ddof=1)
-    s2 = np.std(post_scores, ddof=1)
+    m1 = fmean(pre_scores)
+    m2 = fmean(post_scores)
+    s1 = stdev(pre_scores, m1)
+    s2 = stdev(post_scores, m2)
     n1 = len(pre_scores)
     n2 = len(post_scores)
     
     # Pooled standard deviation
-    sp = np.sqrt(((n1 - 1) * s1**2 + (n2 - 1) * s2**2) / (n1 + n2 - 2))
+    sp = math.sqrt(((n1 - 1) * s1**2 + (n2 - 1) * s2**2) / (n1 + n2 - 2))
     
     if sp == 0:
         return {"cohens_d": 0.0, "interpretation": "No variability in data"}
@@ -351,7 +356,7 @@ def calculate_effect_size(pre_scores: List[float], post_scores: List[float]) ->
     d = (m2 - m1) / sp
     
     # Confidence interval for d
-    se_d = np.sqrt((n1 + n2) / (n1 * n2) + d**2 / (2 * (n1 + n2)))
+    se_d = math.sqrt((n1 + n2) / (n1 * n2) + d**2 / (2 * (n1 + n2)))
     ci_low = d - 1.96 * se_d
     ci_high = d + 1.96 * se_d
     
@@ -455,9 +460,8 @@ def compare_pre_post_assessment(db: Session, user_id: int) -> Optional[Dict]:
     if not baseline or not post_test:
         return None
     
-    import json
-    pre_results = json.loads(baseline.scenario_results or "{}")
-    post_results = json.loads(post_test.scenario_results or "{}")
+    pre_results = baseline.scenario_results or {}
+    post_results = post_test.scenario_results or {}
     
     pre_scores = [pre_results.get(s, {}).get("accuracy", 0) for s in 
                   ["tsunami_siren", "earthquake_alarm", "flood_warning", "air_raid_siren", "building_fire_alarm"]]